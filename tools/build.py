@@ -2,11 +2,18 @@
 from __future__ import annotations
 
 import argparse
+import atexit
+import hashlib
 import json
 import os
 import platform
+import re
 import shutil
 import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from fnmatch import fnmatch
 from functools import lru_cache
 from pathlib import Path
@@ -18,6 +25,12 @@ OPENCL_STUB_DIR = THIRD_PARTY_DIR / "opencl-stubs"
 BIN_DIR = REPO_ROOT / "bin"
 BUILD_ROOT = REPO_ROOT / "build"
 
+# Host identity never changes within a run; platform.system()/machine() can
+# hit /proc or spawn helpers on some platforms, so resolve them once.
+HOST_SYSTEM_NAME = platform.system()
+HOST_SYSTEM = HOST_SYSTEM_NAME.lower()
+HOST_MACHINE = platform.machine().lower()
+
 
 APPLE_TARGETS = {
     "macos-arm64": ("macos-arm64", BIN_DIR / "macos/arm64"),
@@ -84,11 +97,67 @@ def fail(message: str) -> None:
     raise SystemExit(message)
 
 
+@lru_cache(maxsize=None)
+def _which(name: str) -> str | None:
+    """shutil.which with a cache; PATH doesn't change during a run and the
+    same tools (ninja, nvcc, glslc, ...) are probed repeatedly."""
+
+    return shutil.which(name)
+
+
+_PRINT_LOCK = threading.Lock()
+
+
 def run(cmd: list[str], *, env: dict[str, str] | None = None) -> None:
-    print("+", " ".join(cmd))
-    effective_env = (env.copy() if env is not None else os.environ.copy())
-    effective_env.setdefault("CCACHE_DIR", str(REPO_ROOT / ".ccache"))
-    subprocess.run(cmd, cwd=REPO_ROOT, env=effective_env, check=True)
+    with _PRINT_LOCK:
+        print("+", " ".join(cmd))
+    # main() seeds CCACHE_DIR in os.environ, so the common no-override case
+    # can let the child inherit instead of cloning the whole environment.
+    if env is None:
+        effective_env = None
+        if "CCACHE_DIR" not in os.environ:
+            os.environ["CCACHE_DIR"] = str(REPO_ROOT / ".ccache")
+    else:
+        effective_env = env.copy()
+        effective_env.setdefault("CCACHE_DIR", str(REPO_ROOT / ".ccache"))
+    # Drain child output through a buffered pipe instead of inheriting stdio:
+    # chatty cmake/ninja runs otherwise flush line-by-line through the
+    # terminal's write path, which can throttle the build under CI capture.
+    proc = subprocess.Popen(
+        cmd,
+        cwd=REPO_ROOT,
+        env=effective_env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        bufsize=64 * 1024,
+        text=True,
+        encoding="utf-8",
+        # Compiler output isn't guaranteed UTF-8 (localized MSVC diagnostics,
+        # raw source bytes in GCC messages); never let decoding kill the build.
+        errors="replace",
+    )
+    with proc.stdout:
+        for line in proc.stdout:
+            sys.stdout.write(line)
+    sys.stdout.flush()
+    returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+@lru_cache(maxsize=1)
+def detect_compiler_launcher() -> str | None:
+    """Locate a compiler cache launcher (ccache preferred, then sccache).
+
+    ccache comes first because the driver and CI both persist CCACHE_DIR;
+    sccache's local cache would start cold every run. On Windows hosts
+    clcache is accepted as a last resort for MSVC builds.
+    """
+
+    launcher = _which("ccache") or _which("sccache")
+    if not launcher and HOST_SYSTEM == "windows":
+        launcher = _which("clcache")
+    return launcher
 
 
 @lru_cache(maxsize=1)
@@ -100,24 +169,154 @@ def load_cmake_presets() -> dict:
         fail(f"Failed to read {presets_path}: {exc}")
 
 
-def resolve_build_dir_for_preset(preset: str) -> Path:
-    data = load_cmake_presets()
-    for cfg in data.get("configurePresets", []):
-        if cfg.get("name") != preset:
+@lru_cache(maxsize=1)
+def load_user_presets() -> dict:
+    """Load CMakeUserPresets.json (generated by tools/gen_presets.py)."""
+
+    presets_path = REPO_ROOT / "CMakeUserPresets.json"
+    if not presets_path.is_file():
+        return {}
+    try:
+        return json.loads(presets_path.read_text(encoding="utf-8"))
+    except Exception as exc:
+        fail(f"Failed to read {presets_path}: {exc}")
+
+
+def all_configure_presets() -> list[dict]:
+    return load_cmake_presets().get("configurePresets", []) + load_user_presets().get(
+        "configurePresets", []
+    )
+
+
+@lru_cache(maxsize=1)
+def preset_build_dirs() -> dict[str, Path]:
+    mapping: dict[str, Path] = {}
+    for cfg in all_configure_presets():
+        name = cfg.get("name")
+        if not name:
             continue
         binary_dir = cfg.get("binaryDir")
-        if not binary_dir:
-            return BUILD_ROOT / preset
-        resolved = binary_dir.replace("${sourceDir}", str(REPO_ROOT)).replace("${presetName}", preset)
-        return Path(resolved)
-    return BUILD_ROOT / preset
+        if binary_dir:
+            resolved = binary_dir.replace("${sourceDir}", str(REPO_ROOT)).replace("${presetName}", name)
+            mapping[name] = Path(resolved)
+        else:
+            mapping[name] = BUILD_ROOT / name
+    return mapping
+
+
+def resolve_build_dir_for_preset(preset: str) -> Path:
+    return preset_build_dirs().get(preset, BUILD_ROOT / preset)
+
+
+@lru_cache(maxsize=1)
+def configure_presets_by_name() -> dict[str, dict]:
+    return {cfg["name"]: cfg for cfg in all_configure_presets() if cfg.get("name")}
+
+
+@lru_cache(maxsize=1)
+def generated_presets_available() -> bool:
+    """Refresh CMakeUserPresets.json via gen_presets, once per process."""
+
+    import gen_presets
+
+    try:
+        gen_presets.ensure_user_presets()
+    except OSError as exc:
+        print(f"Warning: could not generate backend presets ({exc}); using cache args instead")
+        return False
+    # Drop preset caches primed before the file was (re)written; the
+    # generated presets' binary dirs come from the parent full presets.
+    load_user_presets.cache_clear()
+    preset_build_dirs.cache_clear()
+    configure_presets_by_name.cache_clear()
+    preset_generator.cache_clear()
+    return True
+
+
+def backend_preset(platform_key: str, arch: str, backend: str) -> str | None:
+    """Return the generated preset name for a non-full backend build.
+
+    The generated presets keep the backend's cache variables in a static
+    preset (sharing the full preset's binary directory) instead of
+    per-run cache arguments. Returns None for "full" builds, which use
+    the hand-written presets, or when generation is not possible.
+    """
+
+    if backend == "full":
+        return None
+    if not generated_presets_available():
+        return None
+    return f"{platform_key}-{arch}-{backend}"
+
+
+@lru_cache(maxsize=None)
+def preset_generator(preset: str) -> str | None:
+    """Resolve the generator a configure preset uses, following inherits."""
+
+    cfg = configure_presets_by_name().get(preset)
+    if not cfg:
+        return None
+    generator = cfg.get("generator")
+    if generator:
+        return generator
+    inherits = cfg.get("inherits") or []
+    if isinstance(inherits, str):
+        inherits = [inherits]
+    for parent in inherits:
+        generator = preset_generator(parent)
+        if generator:
+            return generator
+    return None
+
+
+def submodule_dir_for(path: Path) -> Path | None:
+    try:
+        relative = path.relative_to(THIRD_PARTY_DIR)
+    except ValueError:
+        return None
+    if not relative.parts:
+        return None
+    return THIRD_PARTY_DIR / relative.parts[0]
 
 
 def ensure_submodule(path: Path, error: str) -> None:
+    if path.is_file():
+        return
+
+    # Try a shallow one-shot init of just the missing submodule before
+    # giving up; full-history clones of llama.cpp and friends pull hundreds
+    # of MB that the build never needs.
+    submodule = submodule_dir_for(path)
+    if submodule is not None:
+        env = os.environ.copy()
+        env.setdefault("GIT_LFS_SKIP_SMUDGE", "1")
+        subprocess.run(
+            [
+                "git",
+                "-C",
+                str(REPO_ROOT),
+                "submodule",
+                "update",
+                "--init",
+                "--recursive",
+                "--depth=1",
+                "--recommend-shallow",
+                str(submodule.relative_to(REPO_ROOT)),
+            ],
+            env=env,
+            check=False,
+        )
+
     if not path.is_file():
         fail(error)
 
 
+ZENDNN_CMAKE_FILE = THIRD_PARTY_DIR / "llama.cpp/ggml/src/ggml-zendnn/CMakeLists.txt"
+ZENDNN_INSTALL_OLD = b"INSTALL_COMMAND ${CMAKE_COMMAND} --build ${ZENDNN_BUILD_DIR} --target install"
+ZENDNN_INSTALL_NEW = b"INSTALL_COMMAND ${CMAKE_COMMAND} --build ${ZENDNN_BUILD_DIR} --target zendnnl"
+ZENDNN_MTIME_STAMP = BUILD_ROOT / ".zendnn-patch-mtime"
+
+
 def patch_llama_zendnn_install_target() -> bool:
     """Patch ZenDNN ExternalProject install target for current llama.cpp revision.
 
@@ -126,73 +325,252 @@ def patch_llama_zendnn_install_target() -> bool:
     dependency install + library staging and is safe for the install step.
     """
 
-    cmake_file = THIRD_PARTY_DIR / "llama.cpp/ggml/src/ggml-zendnn/CMakeLists.txt"
     ensure_submodule(
-        cmake_file,
+        ZENDNN_CMAKE_FILE,
         "Missing ggml-zendnn CMake file in llama.cpp submodule. Run: git submodule update --init --recursive",
     )
 
-    old = "INSTALL_COMMAND ${CMAKE_COMMAND} --build ${ZENDNN_BUILD_DIR} --target install"
-    new = "INSTALL_COMMAND ${CMAKE_COMMAND} --build ${ZENDNN_BUILD_DIR} --target zendnnl"
-
-    text = cmake_file.read_text(encoding="utf-8")
-    if new in text:
+    data = ZENDNN_CMAKE_FILE.read_bytes()
+    if ZENDNN_INSTALL_NEW in data:
         return False
-    if old not in text:
+    if ZENDNN_INSTALL_OLD not in data:
         fail(
             "Could not apply ZenDNN install target patch: expected install command not found in "
-            f"{cmake_file}"
+            f"{ZENDNN_CMAKE_FILE}"
         )
 
-    cmake_file.write_text(text.replace(old, new), encoding="utf-8")
+    # Remember the original mtime so the restore can put it back; ccache's
+    # direct-mode fast path keys on it and a fresh timestamp would force
+    # re-hashing on the next CI run.
+    orig_mtime_ns = ZENDNN_CMAKE_FILE.stat().st_mtime_ns
+    ZENDNN_CMAKE_FILE.write_bytes(data.replace(ZENDNN_INSTALL_OLD, ZENDNN_INSTALL_NEW))
+    ZENDNN_MTIME_STAMP.parent.mkdir(parents=True, exist_ok=True)
+    ZENDNN_MTIME_STAMP.write_text(str(orig_mtime_ns), encoding="utf-8")
     print("Patched llama.cpp ggml-zendnn install target to zendnnl")
     return True
 
 
 def restore_llama_zendnn_install_target() -> None:
-    cmake_file = THIRD_PARTY_DIR / "llama.cpp/ggml/src/ggml-zendnn/CMakeLists.txt"
-    old = "INSTALL_COMMAND ${CMAKE_COMMAND} --build ${ZENDNN_BUILD_DIR} --target install"
-    new = "INSTALL_COMMAND ${CMAKE_COMMAND} --build ${ZENDNN_BUILD_DIR} --target zendnnl"
-
-    if not cmake_file.is_file():
+    if not ZENDNN_CMAKE_FILE.is_file():
         return
 
-    text = cmake_file.read_text(encoding="utf-8")
-    if new not in text:
+    data = ZENDNN_CMAKE_FILE.read_bytes()
+    if ZENDNN_INSTALL_NEW not in data:
         return
 
-    cmake_file.write_text(text.replace(new, old), encoding="utf-8")
+    ZENDNN_CMAKE_FILE.write_bytes(data.replace(ZENDNN_INSTALL_NEW, ZENDNN_INSTALL_OLD))
+    if ZENDNN_MTIME_STAMP.is_file():
+        try:
+            orig_mtime_ns = int(ZENDNN_MTIME_STAMP.read_text(encoding="utf-8"))
+            stat = ZENDNN_CMAKE_FILE.stat()
+            os.utime(ZENDNN_CMAKE_FILE, ns=(stat.st_atime_ns, orig_mtime_ns))
+        except (OSError, ValueError):
+            pass
+        ZENDNN_MTIME_STAMP.unlink(missing_ok=True)
     print("Restored llama.cpp ggml-zendnn install target to install")
 
 
+_CLEANUP_THREADS: list[threading.Thread] = []
+
+
+def _join_cleanup_threads() -> None:
+    for thread in _CLEANUP_THREADS:
+        thread.join()
+
+
+atexit.register(_join_cleanup_threads)
+
+
+def _start_background_rmtree(path: Path) -> None:
+    thread = threading.Thread(target=shutil.rmtree, args=(path,), kwargs={"ignore_errors": True}, daemon=True)
+    thread.start()
+    _CLEANUP_THREADS.append(thread)
+
+
+def remove_dir_in_background(path: Path) -> None:
+    """Rename path aside and delete it on a background thread.
+
+    The rename is O(1) on the same filesystem, so the unlink storm of a
+    populated build tree overlaps with the fresh configure instead of
+    delaying it. Falls back to a synchronous rmtree if the rename fails
+    (e.g. the doomed tree is locked on Windows).
+    """
+
+    graveyard = path.parent / f".trash-{path.name}-{os.getpid()}"
+    try:
+        os.rename(path, graveyard)
+    except OSError:
+        shutil.rmtree(path)
+        return
+
+    _start_background_rmtree(graveyard)
+
+
+_SWEPT_TRASH: set[str] = set()
+
+
+def sweep_orphaned_trash(parent: Path) -> None:
+    """Queue deletion of graveyards a dead run left behind.
+
+    The background rmtree never finishes if the process dies first (Ctrl-C
+    skips atexit), so later runs sweep any leftover .trash-* siblings.
+    """
+
+    try:
+        with os.scandir(parent) as entries:
+            orphans = [
+                entry.path
+                for entry in entries
+                if entry.name.startswith(".trash-") and entry.is_dir(follow_symlinks=False)
+            ]
+    except OSError:
+        return
+    for orphan in orphans:
+        if orphan in _SWEPT_TRASH:
+            continue
+        _SWEPT_TRASH.add(orphan)
+        _start_background_rmtree(Path(orphan))
+
+
 def clean_build_dir(preset: str, clean: bool) -> Path:
     build_dir = resolve_build_dir_for_preset(preset)
+    sweep_orphaned_trash(build_dir.parent)
     if clean and build_dir.exists():
-        shutil.rmtree(build_dir)
+        remove_dir_in_background(build_dir)
     return build_dir
 
 
+CONFIGURE_STAMP_NAME = ".llamadart-configure.stamp"
+
+# Environment variables that actually feed into a configure; hashing the full
+# environment would make unrelated drift (CI run ids, shell session vars)
+# defeat the configure skip on every run.
+CONFIGURE_ENV_KEYS = (
+    "ANDROID_NDK_HOME",
+    "CMAKE_GENERATOR",
+    "CMAKE_C_COMPILER_LAUNCHER",
+    "CMAKE_CXX_COMPILER_LAUNCHER",
+    "CMAKE_CUDA_COMPILER_LAUNCHER",
+)
+
+
+def configure_signature(preset: str, configure_cmd: list[str], env: dict[str, str] | None) -> str:
+    effective_env = env if env is not None else os.environ
+    material: list[object] = [
+        configure_cmd,
+        [(key, effective_env.get(key)) for key in CONFIGURE_ENV_KEYS],
+    ]
+    # Generated presets carry their backend cache variables in
+    # CMakeUserPresets.json rather than on the command line, so hash the
+    # preset definition or edits to the backend tables would be skipped.
+    cfg = configure_presets_by_name().get(preset)
+    if cfg:
+        material.append(cfg)
+    # Initial-cache scripts keep a stable path across backends, so hash their
+    # contents too or a backend switch would be mistaken for a fresh cache.
+    for index, arg in enumerate(configure_cmd):
+        if arg == "-C" and index + 1 < len(configure_cmd):
+            try:
+                material.append(Path(configure_cmd[index + 1]).read_text(encoding="utf-8"))
+            except OSError:
+                pass
+    return hashlib.sha256(repr(material).encode("utf-8")).hexdigest()
+
+
+def configure_is_fresh(build_dir: Path, signature: str) -> bool:
+    """Report whether the existing CMake cache already matches this configure.
+
+    Re-generation on llama.cpp-sized trees costs double-digit seconds, so skip
+    it when the cache exists, is newer than CMakePresets.json, and was produced
+    with the same command line and environment.
+    """
+
+    cache_file = build_dir / "CMakeCache.txt"
+    stamp_file = build_dir / CONFIGURE_STAMP_NAME
+    if not cache_file.is_file() or not stamp_file.is_file():
+        return False
+    try:
+        if stamp_file.read_text(encoding="utf-8").strip() != signature:
+            return False
+        presets_mtime = (REPO_ROOT / "CMakePresets.json").stat().st_mtime
+        return cache_file.stat().st_mtime >= presets_mtime
+    except OSError:
+        return False
+
+
+def want_unity_build(args: argparse.Namespace, build_dir: Path) -> bool:
+    if args.no_unity:
+        return False
+    return args.clean or not build_dir.exists()
+
+
 def configure_and_build(
     preset: str,
     *,
     jobs: int | None,
     extra_cmake_args: list[str] | None = None,
     env: dict[str, str] | None = None,
+    cuda: bool = False,
+    unity: bool = False,
 ) -> Path:
     configure_cmd = ["cmake", "--preset", preset]
+    # A launcher configured in the environment (e.g. by CI) wins; -D flags
+    # would override the CMAKE_<LANG>_COMPILER_LAUNCHER env defaults.
+    if "CMAKE_C_COMPILER_LAUNCHER" in (env if env is not None else os.environ):
+        launcher = None
+    else:
+        launcher = detect_compiler_launcher()
+    if launcher:
+        configure_cmd.extend(
+            [
+                f"-DCMAKE_C_COMPILER_LAUNCHER={launcher}",
+                f"-DCMAKE_CXX_COMPILER_LAUNCHER={launcher}",
+            ]
+        )
+        if cuda:
+            configure_cmd.append(f"-DCMAKE_CUDA_COMPILER_LAUNCHER={launcher}")
+    # Unity builds amortize header parsing on cold builds but hurt
+    # incremental rebuilds, so callers only request them for fresh trees.
+    # Always pass the value: CMAKE_UNITY_BUILD persists in the cache once
+    # set, so warm rebuilds must explicitly flip it back OFF.
+    configure_cmd.extend(
+        [
+            f"-DCMAKE_UNITY_BUILD={'ON' if unity else 'OFF'}",
+            "-DCMAKE_UNITY_BUILD_BATCH_SIZE=16",
+        ]
+    )
     if extra_cmake_args:
         configure_cmd.extend(extra_cmake_args)
-    run(configure_cmd, env=env)
+
+    generator = preset_generator(preset)
+    if generator is None and _which("ninja"):
+        # Default to Ninja for presets that don't force a generator; it has
+        # far lower per-edge overhead than Make/MSBuild on this many TUs.
+        generator = "Ninja"
+        env = dict(env if env is not None else os.environ)
+        env.setdefault("CMAKE_GENERATOR", generator)
+
+    build_dir = resolve_build_dir_for_preset(preset)
+    signature = configure_signature(preset, configure_cmd, env)
+    if configure_is_fresh(build_dir, signature):
+        print(f"Skipping configure for preset {preset} (cache is up to date)")
+    else:
+        run(configure_cmd, env=env)
+        (build_dir / CONFIGURE_STAMP_NAME).write_text(signature, encoding="utf-8")
 
     build_cmd = ["cmake", "--build", "--preset", preset]
     if jobs and jobs > 0:
         build_cmd.extend(["--parallel", str(jobs)])
+    if generator == "Ninja":
+        # Keep going after the first error so parallel compilation (and the
+        # compiler cache) still covers as much of the graph as possible.
+        build_cmd.extend(["--", "-k", "0"])
     run(build_cmd, env=env)
-    return resolve_build_dir_for_preset(preset)
+    return build_dir
 
 
 def detect_linux_arch() -> str:
-    machine = platform.machine().lower()
+    machine = HOST_MACHINE
     if machine in ("x86_64", "amd64", "x64"):
         return "x64"
     if machine in ("aarch64", "arm64"):
@@ -200,8 +578,26 @@ def detect_linux_arch() -> str:
     fail(f"Unsupported host architecture '{machine}' for Linux builds")
 
 
-def cmake_cache_args(cache_vars: dict[str, str]) -> list[str]:
-    return [f"-D{key}={value}" for key, value in cache_vars.items()]
+def write_initial_cache(build_dir: Path, cache_vars: dict[str, str]) -> Path:
+    """Write cache_vars to an initial-cache script for cmake -C.
+
+    Loading the backend switches from one file keeps argv short (MSVC command
+    lines have hard limits) and lets them override preset cacheVariables,
+    which the CLI cannot do per-entry.
+    """
+
+    build_dir.mkdir(parents=True, exist_ok=True)
+    cache_file = build_dir / "llamadart-initial-cache.cmake"
+    lines = []
+    for key, value in cache_vars.items():
+        var_type = "BOOL" if value in ("ON", "OFF") else "STRING"
+        lines.append(f'set({key} "{value}" CACHE {var_type} "" FORCE)')
+    cache_file.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return cache_file
+
+
+def initial_cache_args(build_dir: Path, cache_vars: dict[str, str]) -> list[str]:
+    return ["-C", str(write_initial_cache(build_dir, cache_vars))]
 
 
 def linux_backend_cache_vars(arch: str, backend: str) -> dict[str, str]:
@@ -292,10 +688,15 @@ def detect_android_ndk() -> Path | None:
 
     for root in sdk_roots:
         ndk_root = root / "ndk"
-        if ndk_root.is_dir():
-            versions = sorted([p for p in ndk_root.iterdir() if p.is_dir()], reverse=True)
-            if versions:
-                return versions[0]
+        try:
+            # scandir reuses the readdir type info, avoiding a stat per
+            # installed NDK version; max() matches sorted(reverse=True)[0].
+            with os.scandir(ndk_root) as entries:
+                versions = [entry.path for entry in entries if entry.is_dir()]
+        except OSError:
+            continue
+        if versions:
+            return Path(max(versions))
 
     legacy = Path("/usr/local/lib/android/sdk/ndk-bundle")
     if legacy.is_dir():
@@ -303,18 +704,23 @@ def detect_android_ndk() -> Path | None:
     return None
 
 
-def find_file_with_suffix(root: Path, suffix: str, *, contains: str | None = None) -> Path | None:
-    for p in root.rglob("*"):
+@lru_cache(maxsize=None)
+def _find_file_with_suffix(root: str, suffix: str, contains: str | None) -> Path | None:
+    # Glob on the suffix so the walk only materializes matching names instead
+    # of every entry under the tree (the NDK alone has hundreds of thousands).
+    for p in Path(root).rglob(f"*{suffix}"):
         if not p.is_file():
             continue
-        if not str(p).endswith(suffix):
-            continue
         if contains and contains not in str(p):
             continue
         return p
     return None
 
 
+def find_file_with_suffix(root: Path, suffix: str, *, contains: str | None = None) -> Path | None:
+    return _find_file_with_suffix(str(root), suffix, contains)
+
+
 def infer_vulkan_sdk(path_hint: str | None) -> Path | None:
     if path_hint:
         p = Path(path_hint).expanduser()
@@ -327,7 +733,7 @@ def infer_vulkan_sdk(path_hint: str | None) -> Path | None:
         if p.exists():
             return p
 
-    glslc = shutil.which("glslc") or shutil.which("glslc.exe")
+    glslc = _which("glslc") or _which("glslc.exe")
     if glslc:
         glslc_path = Path(glslc).resolve()
         for parent in (glslc_path.parent, glslc_path.parent.parent):
@@ -356,6 +762,46 @@ def abi_env_key(abi: str) -> str:
     return abi.upper().replace("-", "_")
 
 
+@dataclass(frozen=True)
+class NdkIndex:
+    """Tool/library paths resolved from the NDK in one up-front scan."""
+
+    glslc: Path | None
+    vulkan_libs: dict[str, Path | None]
+    opencl_libs: dict[str, Path | None]
+
+
+def scan_ndk(ndk: Path, abis: list[str]) -> NdkIndex:
+    """Probe the NDK for glslc and per-ABI Vulkan/OpenCL libraries.
+
+    The probes are independent IO-bound walks, so they run concurrently;
+    on a network-mounted NDK this phase shrinks to the slowest single scan.
+    """
+
+    def find_glslc() -> Path | None:
+        return find_file_with_suffix(ndk, "glslc") or find_file_with_suffix(ndk, "glslc.exe")
+
+    def find_vulkan(abi: str) -> Path | None:
+        arch_path = ANDROID_ARCH_PATH[abi]
+        lib = find_file_with_suffix(ndk, "libvulkan.so", contains=f"/{arch_path}/28/")
+        if not lib:
+            lib = find_file_with_suffix(ndk, "libvulkan.so", contains=f"/{arch_path}/")
+        return lib
+
+    def find_opencl(abi: str) -> Path | None:
+        return find_file_with_suffix(ndk, "libOpenCL.so", contains=f"/{ANDROID_ARCH_PATH[abi]}/")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        glslc_future = executor.submit(find_glslc)
+        vulkan_futures = {abi: executor.submit(find_vulkan, abi) for abi in abis}
+        opencl_futures = {abi: executor.submit(find_opencl, abi) for abi in abis}
+        return NdkIndex(
+            glslc=glslc_future.result(),
+            vulkan_libs={abi: future.result() for abi, future in vulkan_futures.items()},
+            opencl_libs={abi: future.result() for abi, future in opencl_futures.items()},
+        )
+
+
 def build_android_opencl_loader(abi: str, ndk: Path, build_dir: Path, env: dict[str, str], jobs: int | None) -> Path | None:
     if not OPENCL_LOADER_DIR.joinpath("CMakeLists.txt").is_file():
         return None
@@ -395,7 +841,14 @@ def build_android_opencl_loader(abi: str, ndk: Path, build_dir: Path, env: dict[
     return find_file_with_suffix(loader_build, "libOpenCL.so")
 
 
-def resolve_android_opencl(abi: str, ndk: Path, build_dir: Path, env: dict[str, str], jobs: int | None) -> tuple[Path, Path]:
+def resolve_android_opencl(
+    abi: str,
+    ndk: Path,
+    ndk_index: NdkIndex,
+    build_dir: Path,
+    env: dict[str, str],
+    jobs: int | None,
+) -> tuple[Path, Path]:
     env_key = abi_env_key(abi)
     include_env = os.environ.get("OPENCL_INCLUDE_DIR")
     lib_env = os.environ.get(f"OPENCL_LIBRARY_ANDROID_{env_key}")
@@ -416,8 +869,7 @@ def resolve_android_opencl(abi: str, ndk: Path, build_dir: Path, env: dict[str,
         if not opencl_lib.is_file():
             fail(f"OPENCL_LIBRARY_ANDROID_{env_key} is set but file does not exist: {opencl_lib}")
     else:
-        arch_path = ANDROID_ARCH_PATH[abi]
-        opencl_lib = find_file_with_suffix(ndk, "libOpenCL.so", contains=f"/{arch_path}/")
+        opencl_lib = ndk_index.opencl_libs.get(abi)
         if not opencl_lib:
             prebuilt = OPENCL_STUB_DIR / "android" / abi / "libOpenCL.so"
             if prebuilt.is_file():
@@ -446,31 +898,45 @@ def resolve_android_opencl(abi: str, ndk: Path, build_dir: Path, env: dict[str,
     return opencl_include, opencl_lib
 
 
+# Keep canonical runtime filenames only (drop Linux SONAME aliases like libfoo.so.0 / libfoo.so.0.0.0).
+RUNTIME_LIBRARY_SUFFIXES = (".dll", ".dylib", ".so")
+
+# Build-tree directories that are all intermediates and never hold runtime libraries.
+RUNTIME_SCAN_SKIP_DIRS = {"CMakeFiles", "_deps"}
+
+
+# One DFA pass over the (lowercased) name instead of eight startswith calls;
+# collect_runtime_libraries runs this for every shared library in the tree.
+RUNTIME_LIBRARY_NAME_RE = re.compile(r"^(?:lib)?(?:llamadart|llama|ggml|mtmd)")
+
+
 def is_runtime_library(path: Path) -> bool:
     name = path.name.lower()
-    if not path.is_file():
+    if not name.endswith(RUNTIME_LIBRARY_SUFFIXES):
         return False
+    return RUNTIME_LIBRARY_NAME_RE.match(name) is not None
 
-    # Keep canonical runtime filenames only (drop Linux SONAME aliases like libfoo.so.0 / libfoo.so.0.0.0).
-    if not (name.endswith(".dll") or name.endswith(".dylib") or name.endswith(".so")):
-        return False
 
-    prefixes = (
-        "llamadart",
-        "llama",
-        "ggml",
-        "mtmd",
-        "libllamadart",
-        "libllama",
-        "libggml",
-        "libmtmd",
-    )
-    return any(name.startswith(p) for p in prefixes)
+def iter_shared_libraries(root: Path):
+    """Yield shared-library files under root, pruning intermediate build dirs.
+
+    Uses os.scandir so file-type checks come from the directory entries
+    instead of a stat per artifact; a populated llama.cpp build tree holds
+    tens of thousands of objects that never need touching.
+    """
+
+    with os.scandir(root) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in RUNTIME_SCAN_SKIP_DIRS:
+                    yield from iter_shared_libraries(Path(entry.path))
+            elif entry.is_file() and entry.name.lower().endswith(RUNTIME_LIBRARY_SUFFIXES):
+                yield Path(entry.path)
 
 
 def collect_runtime_libraries(build_dir: Path) -> list[Path]:
     selected: dict[str, Path] = {}
-    for p in sorted(build_dir.rglob("*")):
+    for p in sorted(iter_shared_libraries(build_dir)):
         if not is_runtime_library(p):
             continue
         selected[p.name] = p
@@ -481,16 +947,38 @@ def collect_runtime_libraries(build_dir: Path) -> list[Path]:
     return [selected[k] for k in sorted(selected)]
 
 
-def reset_dir(path: Path) -> None:
-    if path.exists():
-        shutil.rmtree(path)
-    path.mkdir(parents=True, exist_ok=True)
-
-
 def copy_output(src: Path, dst: Path) -> None:
     dst.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(src, dst)
-    print(f"Built: {dst.relative_to(REPO_ROOT)}")
+    # copyfile + copymode skips the extra stat/utime work copy2 does for
+    # metadata that build outputs don't need.
+    shutil.copyfile(src, dst)
+    shutil.copymode(src, dst)
+
+
+def _hash_sidecar(out_dir: Path, name: str) -> Path:
+    # Dot-prefixed so artifact upload globs over bin/ don't pick it up.
+    return out_dir / f".{name}.sha256"
+
+
+def _sync_runtime_library(src: Path, out_dir: Path) -> bool:
+    """Copy src into out_dir unless the staged copy already matches.
+
+    Skipping byte-identical libraries keeps their mtimes stable, so file
+    watchers and macOS code-signing caches downstream don't re-trigger on
+    every rebuild. Returns True when the file was actually copied.
+    """
+
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()
+    dst = out_dir / src.name
+    sidecar = _hash_sidecar(out_dir, src.name)
+    try:
+        if dst.is_file() and sidecar.read_text(encoding="utf-8").strip() == digest:
+            return False
+    except OSError:
+        pass
+    copy_output(src, dst)
+    sidecar.write_text(digest, encoding="utf-8")
+    return True
 
 
 def copy_runtime_libraries(build_dir: Path, out_dir: Path) -> None:
@@ -503,16 +991,32 @@ def copy_runtime_libraries(build_dir: Path, out_dir: Path) -> None:
             unique[key] = lib
     libs = [unique[k] for k in sorted(unique)]
 
-    reset_dir(out_dir)
-
-    for src in libs:
-        copy_output(src, out_dir / src.name)
+    out_dir.mkdir(parents=True, exist_ok=True)
 
-    print(f"Copied {len(libs)} runtime libraries to {out_dir.relative_to(REPO_ROOT)}")
+    # Drop leftovers from earlier runs with a different backend/library set.
+    expected = {lib.name for lib in libs} | {_hash_sidecar(out_dir, lib.name).name for lib in libs}
+    for entry in list(out_dir.iterdir()):
+        if entry.name in expected:
+            continue
+        if entry.is_dir():
+            shutil.rmtree(entry)
+        else:
+            entry.unlink()
+
+    # Copies are independent per file; running them concurrently hides the
+    # per-file write/sync latency behind the largest library.
+    with ThreadPoolExecutor(max_workers=min(8, len(libs))) as executor:
+        copied = sum(executor.map(lambda src: _sync_runtime_library(src, out_dir), libs))
+
+    skipped = len(libs) - copied
+    print(
+        f"Copied {copied} runtime libraries ({skipped} unchanged) to "
+        f"{out_dir.relative_to(REPO_ROOT)}"
+    )
 
 
 def collect_windows_runtime_dependencies(primary_libs: list[Path]) -> list[Path]:
-    if platform.system().lower() != "windows":
+    if HOST_SYSTEM != "windows":
         return []
 
     if not primary_libs:
@@ -552,10 +1056,10 @@ def collect_windows_runtime_dependencies(primary_libs: list[Path]) -> list[Path]
 
 
 def read_windows_dependents(dll_path: Path) -> set[str]:
-    if platform.system().lower() != "windows":
+    if HOST_SYSTEM != "windows":
         return set()
 
-    dumpbin = shutil.which("dumpbin")
+    dumpbin = _which("dumpbin")
     if not dumpbin:
         fail("dumpbin is required to inspect Windows DLL dependencies")
 
@@ -717,7 +1221,7 @@ def resolve_windows_dependency(name: str, roots: list[Path]) -> Path | None:
 
 
 def build_apple(args: argparse.Namespace) -> None:
-    if platform.system().lower() != "darwin":
+    if HOST_SYSTEM != "darwin":
         fail("Apple builds must be run on macOS hosts")
     ensure_submodule(
         THIRD_PARTY_DIR / "llama.cpp/CMakeLists.txt",
@@ -726,13 +1230,13 @@ def build_apple(args: argparse.Namespace) -> None:
 
     normalized, out_dir = APPLE_TARGETS[args.target]
     preset = f"{normalized}-full"
-    clean_build_dir(preset, args.clean)
-    build_dir = configure_and_build(preset, jobs=args.jobs)
+    build_dir = clean_build_dir(preset, args.clean)
+    build_dir = configure_and_build(preset, jobs=args.jobs, unity=want_unity_build(args, build_dir))
     copy_runtime_libraries(build_dir, out_dir)
 
 
 def build_linux(args: argparse.Namespace) -> None:
-    if platform.system().lower() != "linux":
+    if HOST_SYSTEM != "linux":
         fail("Linux builds must be run on Linux hosts")
     ensure_submodule(
         THIRD_PARTY_DIR / "llama.cpp/CMakeLists.txt",
@@ -741,15 +1245,16 @@ def build_linux(args: argparse.Namespace) -> None:
 
     arch = args.arch or detect_linux_arch()
     backend = args.backend
-    preset = f"linux-{arch}-full"
-    clean_build_dir(preset, args.clean)
+    generated_preset = backend_preset("linux", arch, backend)
+    preset = generated_preset or f"linux-{arch}-full"
+    build_dir = clean_build_dir(preset, args.clean)
 
     cache_vars = linux_backend_cache_vars(arch, backend)
-    extra_args = cmake_cache_args(cache_vars)
+    extra_args = [] if generated_preset else initial_cache_args(build_dir, cache_vars)
     host_arch = detect_linux_arch()
     if arch == "arm64" and host_arch != "arm64":
-        cc = shutil.which("aarch64-linux-gnu-gcc")
-        cxx = shutil.which("aarch64-linux-gnu-g++")
+        cc = _which("aarch64-linux-gnu-gcc")
+        cxx = _which("aarch64-linux-gnu-g++")
         if not cc or not cxx:
             fail("Cross compiler not found. Install aarch64-linux-gnu-gcc and aarch64-linux-gnu-g++")
         extra_args.extend(
@@ -761,9 +1266,9 @@ def build_linux(args: argparse.Namespace) -> None:
             ]
         )
 
-    if cache_vars["GGML_CUDA"] == "ON" and not (shutil.which("nvcc") or shutil.which("nvcc.exe")):
+    if cache_vars["GGML_CUDA"] == "ON" and not (_which("nvcc") or _which("nvcc.exe")):
         fail("Linux CUDA backend build requires CUDA (nvcc not found in PATH)")
-    if cache_vars["GGML_HIP"] == "ON" and not shutil.which("hipcc"):
+    if cache_vars["GGML_HIP"] == "ON" and not _which("hipcc"):
         fail("Linux HIP backend build requires HIP (hipcc not found in PATH)")
 
     zendnn_patch_applied = False
@@ -771,7 +1276,13 @@ def build_linux(args: argparse.Namespace) -> None:
         zendnn_patch_applied = patch_llama_zendnn_install_target()
 
     try:
-        build_dir = configure_and_build(preset, jobs=args.jobs, extra_cmake_args=extra_args)
+        build_dir = configure_and_build(
+            preset,
+            jobs=args.jobs,
+            extra_cmake_args=extra_args,
+            cuda=cache_vars["GGML_CUDA"] == "ON",
+            unity=want_unity_build(args, build_dir),
+        )
         copy_runtime_libraries(build_dir, BIN_DIR / f"linux/{arch}")
     finally:
         if zendnn_patch_applied:
@@ -779,11 +1290,11 @@ def build_linux(args: argparse.Namespace) -> None:
 
 
 def write_android_host_toolchain(path: Path) -> None:
-    make_program = shutil.which("ninja") or shutil.which("make")
+    make_program = _which("ninja") or _which("make")
     lines = []
     if make_program:
         lines.append(f'set(CMAKE_MAKE_PROGRAM "{make_program}" CACHE STRING "make program" FORCE)')
-    lines.append(f'set(CMAKE_SYSTEM_NAME "{platform.system()}")')
+    lines.append(f'set(CMAKE_SYSTEM_NAME "{HOST_SYSTEM_NAME}")')
     lines.append("set(Threads_FOUND TRUE)")
     lines.append('set(CMAKE_THREAD_LIBS_INIT "-pthread")')
     lines.append("set(CMAKE_USE_PTHREADS_INIT TRUE)")
@@ -791,14 +1302,15 @@ def write_android_host_toolchain(path: Path) -> None:
     path.write_text("\n".join(lines) + "\n", encoding="utf-8")
 
 
-def build_android_abi(abi: str, args: argparse.Namespace, env: dict[str, str]) -> None:
-    preset = f"android-{abi}-full"
-    build_dir = clean_build_dir(preset, args.clean)
+def build_android_abi(abi: str, args: argparse.Namespace, env: dict[str, str], ndk_index: NdkIndex) -> None:
     backend = args.backend
+    generated_preset = backend_preset("android", abi, backend)
+    preset = generated_preset or f"android-{abi}-full"
+    build_dir = clean_build_dir(preset, args.clean)
 
     ndk = Path(env["ANDROID_NDK_HOME"])
     cache_vars = android_backend_cache_vars(abi, backend)
-    extra_args = cmake_cache_args(cache_vars)
+    extra_args = [] if generated_preset else initial_cache_args(build_dir, cache_vars)
     extra_args.extend(
         [
             f"-DCMAKE_C_FLAGS={ANDROID_PRAGMA_WARN_SUPPRESS}",
@@ -807,22 +1319,14 @@ def build_android_abi(abi: str, args: argparse.Namespace, env: dict[str, str]) -
     )
 
     if cache_vars["GGML_VULKAN"] == "ON":
-        ensure_submodule(
-            THIRD_PARTY_DIR / "Vulkan-Headers/include/vulkan/vulkan.h",
-            "Missing submodule: third_party/Vulkan-Headers. Run: git submodule update --init --recursive",
-        )
         toolchain = build_dir / "android-host-toolchain.cmake"
         write_android_host_toolchain(toolchain)
         extra_args.append(f"-DGGML_VULKAN_SHADERS_GEN_TOOLCHAIN={toolchain}")
 
-        glslc = find_file_with_suffix(ndk, "glslc") or find_file_with_suffix(ndk, "glslc.exe")
-        if glslc:
-            extra_args.append(f"-DVulkan_GLSLC_EXECUTABLE={glslc}")
+        if ndk_index.glslc:
+            extra_args.append(f"-DVulkan_GLSLC_EXECUTABLE={ndk_index.glslc}")
 
-        arch_path = ANDROID_ARCH_PATH[abi]
-        vulkan_lib = find_file_with_suffix(ndk, "libvulkan.so", contains=f"/{arch_path}/28/")
-        if not vulkan_lib:
-            vulkan_lib = find_file_with_suffix(ndk, "libvulkan.so", contains=f"/{arch_path}/")
+        vulkan_lib = ndk_index.vulkan_libs.get(abi)
         if not vulkan_lib:
             fail(f"Could not find libvulkan.so in NDK for ABI {abi}")
 
@@ -834,7 +1338,7 @@ def build_android_abi(abi: str, args: argparse.Namespace, env: dict[str, str]) -
         )
 
     if cache_vars["GGML_OPENCL"] == "ON":
-        opencl_include, opencl_lib = resolve_android_opencl(abi, ndk, build_dir, env, args.jobs)
+        opencl_include, opencl_lib = resolve_android_opencl(abi, ndk, ndk_index, build_dir, env, args.jobs)
         extra_args.extend(
             [
                 f"-DOpenCL_INCLUDE_DIR={opencl_include}",
@@ -842,7 +1346,13 @@ def build_android_abi(abi: str, args: argparse.Namespace, env: dict[str, str]) -
             ]
         )
 
-    built_dir = configure_and_build(preset, jobs=args.jobs, extra_cmake_args=extra_args, env=env)
+    built_dir = configure_and_build(
+        preset,
+        jobs=args.jobs,
+        extra_cmake_args=extra_args,
+        env=env,
+        unity=want_unity_build(args, build_dir),
+    )
     out_arch = ANDROID_OUT_ARCH[abi]
     copy_runtime_libraries(built_dir, BIN_DIR / f"android/{out_arch}")
 
@@ -852,6 +1362,13 @@ def build_android(args: argparse.Namespace) -> None:
         THIRD_PARTY_DIR / "llama.cpp/CMakeLists.txt",
         "Missing submodule: third_party/llama.cpp. Run: git submodule update --init --recursive",
     )
+    # Checked here rather than per ABI: the workers run concurrently and
+    # ensure_submodule may shell out to git, which must not race itself.
+    if args.backend in ("full", "vulkan"):
+        ensure_submodule(
+            THIRD_PARTY_DIR / "Vulkan-Headers/include/vulkan/vulkan.h",
+            "Missing submodule: third_party/Vulkan-Headers. Run: git submodule update --init --recursive",
+        )
 
     ndk = detect_android_ndk()
     if not ndk:
@@ -866,13 +1383,34 @@ def build_android(args: argparse.Namespace) -> None:
     else:
         abis = [ANDROID_ABI_ALIASES[args.abi]]
 
-    for abi in abis:
-        print(f"Building Android ABI={abi} backend={args.backend}")
-        build_android_abi(abi, args, env)
+    ndk_index = scan_ndk(ndk, abis)
+
+    # Generate the backend presets before fanning out so the per-ABI workers
+    # never race to rewrite CMakeUserPresets.json.
+    if args.backend != "full":
+        generated_presets_available()
+
+    if len(abis) == 1:
+        print(f"Building Android ABI={abis[0]} backend={args.backend}")
+        build_android_abi(abis[0], args, env, ndk_index)
+        return
+
+    # The per-ABI builds share no outputs, so drive them concurrently and
+    # split the job budget between their Ninja graphs.
+    per_abi_jobs = max(1, (args.jobs or os.cpu_count() or 1) // len(abis))
+    with ThreadPoolExecutor(max_workers=len(abis)) as executor:
+        futures = []
+        for abi in abis:
+            print(f"Building Android ABI={abi} backend={args.backend}")
+            abi_args = argparse.Namespace(**vars(args))
+            abi_args.jobs = per_abi_jobs
+            futures.append(executor.submit(build_android_abi, abi, abi_args, env, ndk_index))
+        for future in futures:
+            future.result()
 
 
 def build_windows(args: argparse.Namespace) -> None:
-    if platform.system().lower() != "windows":
+    if HOST_SYSTEM != "windows":
         fail("Windows builds must be run on Windows hosts")
     ensure_submodule(
         THIRD_PARTY_DIR / "llama.cpp/CMakeLists.txt",
@@ -883,13 +1421,14 @@ def build_windows(args: argparse.Namespace) -> None:
     backend = args.backend
     cache_vars = windows_backend_cache_vars(arch, backend)
 
-    if cache_vars["GGML_CUDA"] == "ON" and not (shutil.which("nvcc") or shutil.which("nvcc.exe")):
+    if cache_vars["GGML_CUDA"] == "ON" and not (_which("nvcc") or _which("nvcc.exe")):
         fail("Windows CUDA backend build requires CUDA (nvcc not found in PATH)")
 
-    preset = f"windows-{arch}-full"
-    clean_build_dir(preset, args.clean)
+    generated_preset = backend_preset("windows", arch, backend)
+    preset = generated_preset or f"windows-{arch}-full"
+    build_dir = clean_build_dir(preset, args.clean)
 
-    extra_args = cmake_cache_args(cache_vars)
+    extra_args = [] if generated_preset else initial_cache_args(build_dir, cache_vars)
     vcpkg_root = detect_vcpkg_root()
     if vcpkg_root and cache_vars["GGML_BLAS"] == "ON":
         toolchain = vcpkg_root / "scripts/buildsystems/vcpkg.cmake"
@@ -917,7 +1456,13 @@ def build_windows(args: argparse.Namespace) -> None:
         if glslc:
             extra_args.append(f"-DVulkan_GLSLC_EXECUTABLE={glslc.as_posix()}")
 
-    build_dir = configure_and_build(preset, jobs=args.jobs, extra_cmake_args=extra_args)
+    build_dir = configure_and_build(
+        preset,
+        jobs=args.jobs,
+        extra_cmake_args=extra_args,
+        cuda=cache_vars["GGML_CUDA"] == "ON",
+        unity=want_unity_build(args, build_dir),
+    )
     copy_runtime_libraries(build_dir, BIN_DIR / f"windows/{arch}")
 
 
@@ -935,6 +1480,11 @@ def print_presets() -> None:
 def add_common_args(parser: argparse.ArgumentParser) -> None:
     parser.add_argument("--clean", action="store_true", help="Delete preset build directory before configure")
     parser.add_argument("--jobs", type=int, default=None, help="Parallel job count passed to cmake --build")
+    parser.add_argument(
+        "--no-unity",
+        action="store_true",
+        help="Disable CMAKE_UNITY_BUILD batching for clean/first-time builds",
+    )
 
 
 def parse_args() -> argparse.Namespace:
@@ -972,6 +1522,7 @@ def parse_args() -> argparse.Namespace:
 
 
 def main() -> None:
+    os.environ.setdefault("CCACHE_DIR", str(REPO_ROOT / ".ccache"))
     args = parse_args()
     args.func(args)
 
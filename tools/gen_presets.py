@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""Generate per-backend CMake presets into CMakeUserPresets.json.
+
+The backend tables in build.py are partially evaluated into static
+configure/build presets (linux-x64-cuda, android-arm64-v8a-vulkan, ...),
+so backend builds become plain `cmake --preset <name>` invocations with
+no per-run -D plumbing and a stable cache signature per preset. Each
+generated preset reuses its parent full preset's binary directory: the
+release workflow asserts the full-preset cache paths (and the short
+wx64/wa64 Windows dirs dodge MAX_PATH), and the configure stamp already
+forces a reconfigure when the backend changes. The file is regenerated
+whenever the tables change and is not checked in.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from pathlib import Path
+
+import build
+
+USER_PRESETS_PATH = build.REPO_ROOT / "CMakeUserPresets.json"
+
+
+def _parent_binary_dir(parent: str) -> str:
+    """Resolve the binary dir the parent preset would use, as preset syntax.
+
+    Walks the inherits chain like CMake does; an inherited
+    ``${presetName}`` resolves to the parent's own name.
+    """
+
+    presets = build.configure_presets_by_name()
+    name: str | None = parent
+    while name:
+        cfg = presets.get(name, {})
+        binary_dir = cfg.get("binaryDir")
+        if binary_dir:
+            return binary_dir.replace("${presetName}", parent)
+        inherits = cfg.get("inherits")
+        name = inherits[0] if isinstance(inherits, list) else inherits
+    return f"${{sourceDir}}/build/{parent}"
+
+
+def generate_presets() -> dict:
+    configure_presets: list[dict] = []
+    build_presets: list[dict] = []
+
+    def add(name: str, parent: str, cache_vars: dict[str, str], *, configuration: str | None = None) -> None:
+        configure_presets.append(
+            {
+                "name": name,
+                "inherits": parent,
+                "binaryDir": _parent_binary_dir(parent),
+                "cacheVariables": dict(cache_vars),
+            }
+        )
+        entry: dict = {"name": name, "configurePreset": name}
+        if configuration:
+            entry["configuration"] = configuration
+        build_presets.append(entry)
+
+    for arch in ("x64", "arm64"):
+        for backend in build.LINUX_BACKENDS:
+            if backend == "full":
+                continue
+            if backend in ("cuda", "hip") and arch != "x64":
+                continue
+            add(f"linux-{arch}-{backend}", f"linux-{arch}-full", build.linux_backend_cache_vars(arch, backend))
+
+    for arch in ("x64", "arm64"):
+        for backend in build.WINDOWS_BACKENDS:
+            if backend == "full":
+                continue
+            if backend == "cuda" and arch != "x64":
+                continue
+            add(
+                f"windows-{arch}-{backend}",
+                f"windows-{arch}-full",
+                build.windows_backend_cache_vars(arch, backend),
+                configuration="Release" if arch == "arm64" else None,
+            )
+
+    for abi in ("arm64-v8a", "x86_64"):
+        for backend in build.ANDROID_BACKENDS:
+            if backend == "full":
+                continue
+            add(f"android-{abi}-{backend}", f"android-{abi}-full", build.android_backend_cache_vars(abi, backend))
+
+    return {
+        "version": 4,
+        "configurePresets": configure_presets,
+        "buildPresets": build_presets,
+    }
+
+
+def ensure_user_presets() -> Path:
+    """Write CMakeUserPresets.json when missing or stale (atomic replace)."""
+
+    desired = json.dumps(generate_presets(), indent=2) + "\n"
+    if USER_PRESETS_PATH.is_file() and USER_PRESETS_PATH.read_text(encoding="utf-8") == desired:
+        return USER_PRESETS_PATH
+
+    tmp = USER_PRESETS_PATH.with_name(
+        f".{USER_PRESETS_PATH.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+    )
+    tmp.write_text(desired, encoding="utf-8")
+    os.replace(tmp, USER_PRESETS_PATH)
+    return USER_PRESETS_PATH
+
+
+def main() -> None:
+    path = ensure_user_presets()
+    print(f"Wrote {path.relative_to(build.REPO_ROOT)}")
+
+
+if __name__ == "__main__":
+    main()